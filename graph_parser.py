@@ -1,101 +1,473 @@
 """
-Parser module for Terraform graph JSON files.
-Processes the graph output from 'terraform graph | dot -Tjson' command.
+Parser module for Terraform graph files.
+Processes the DOT output of the 'terraform graph' command, or its JSON
+rendering from 'terraform graph | dot -Tjson'.
 """
 
+import codecs
+import gc
+import hashlib
 import json
-from typing import Dict, List, Any
+import os
+import re
+import threading
+from sys import intern
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fall back to the stdlib decoder
+    import json as orjson
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - streaming is optional
+    ijson = None
+
+
+# Graph files larger than this are streamed with ijson instead of loaded whole
+STREAMING_THRESHOLD = 64 * 1024 * 1024
+
+# Top-level graph attributes reported by get_graph_metadata()
+METADATA_KEYS = ('name', 'directed', 'strict')
+
+# Column names of the parsed node and edge tables
+NODE_COLUMNS = ('id', 'name', 'label', 'extras', 'hash')
+EDGE_COLUMNS = ('source', 'target', 'label', 'extras')
+
+# Attributes that are mapped to columns or are Graphviz drawing ops
+NODE_EXCLUDED_KEYS = frozenset(('_gvid', 'name', 'label', '_draw_', '_ldraw_'))
+EDGE_EXCLUDED_KEYS = frozenset(('tail', 'head', 'label', '_draw_', '_ldraw_', '_hdraw_'))
+
+# Bump whenever the shape of parse() output changes, to invalidate caches
+CACHE_VERSION = 4
+
+# Serialises progress output of parse_nodes/parse_edges running in parallel
+_print_lock = threading.Lock()
+
+# Statements of the DOT emitted by 'terraform graph'. Every pattern is
+# anchored and free of nested quantifiers, so matching stays linear.
+_DOT_ID = r'"((?:[^"\\]|\\.)*)"'
+DOT_GRAPH_RE = re.compile(r'^\s*(strict\s+)?(digraph|graph)\b\s*(?:' + _DOT_ID + r'|(\w+))?\s*\{')
+DOT_EDGE_RE = re.compile(r'^\s*' + _DOT_ID + r'\s*->\s*' + _DOT_ID + r'\s*(?:\[(.*)\])?')
+DOT_NODE_RE = re.compile(r'^\s*' + _DOT_ID + r'\s*(?:\[(.*)\])?\s*;?\s*$')
+DOT_ATTR_RE = re.compile(r'(\w+)\s*=\s*(?:' + _DOT_ID + r'|([^,;\]\s]+))')
+
+
+def decode_graph(data: bytes) -> Dict[str, Any]:
+    """
+    Decode 'dot -Tjson' output into a graph dictionary.
+    
+    Args:
+        data: Raw graph JSON
+        
+    Returns:
+        Dictionary with 'objects', 'edges' and the top-level attributes
+        
+    Raises:
+        ValueError: If the data is not valid graph JSON
+    """
+    # The decoded tree has no reference cycles, so pause the cyclic GC
+    # instead of letting it rescan every container allocated so far
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        graph = orjson.loads(data)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    
+    if not isinstance(graph, dict):
+        raise ValueError("Graph JSON must be an object")
+    for key in ('objects', 'edges'):
+        if not isinstance(graph.get(key, []), list):
+            raise ValueError(f"Graph JSON '{key}' must be an array")
+    return graph
+
+
+def _dot_unquote(value: str) -> str:
+    """Undo the escaping of double quotes inside a quoted DOT ID."""
+    return value.replace('\\"', '"')
+
+
+def _dot_attrs(attr_list: Optional[str]) -> Dict[str, Any]:
+    """
+    Parse the contents of a DOT attribute list.
+    
+    Args:
+        attr_list: Text between '[' and ']', or None
+        
+    Returns:
+        Dictionary of attribute names to string values
+    """
+    if not attr_list:
+        return {}
+    return {
+        match.group(1): _dot_unquote(match.group(2)) if match.group(2) is not None else match.group(3)
+        for match in DOT_ATTR_RE.finditer(attr_list)
+    }
+
+
+def parse_dot(lines: Iterable[str]) -> Dict[str, Any]:
+    """
+    Parse the DOT output of 'terraform graph' into the 'dot -Tjson' layout.
+    
+    Nodes get a '_gvid' in order of first appearance, as Graphviz assigns
+    them, and keep their attributes; edges reference nodes by '_gvid' in
+    'tail' and 'head'. Graph-level and default attribute statements are
+    ignored.
+    
+    Args:
+        lines: DOT source, one statement per line
+        
+    Returns:
+        Dictionary with 'objects', 'edges' and the top-level attributes
+        
+    Raises:
+        ValueError: If the input has no graph header, i.e. is not DOT
+    """
+    objects = []
+    edges = []
+    graph = {'objects': objects, 'edges': edges}
+    gvids = {}
+    
+    def node_gvid(name: str) -> int:
+        gvid = gvids.get(name)
+        if gvid is None:
+            gvid = gvids[name] = len(objects)
+            objects.append({'_gvid': gvid, 'name': name})
+        return gvid
+    
+    for line in lines:
+        match = DOT_EDGE_RE.match(line)
+        if match:
+            edge = {
+                '_gvid': len(edges),
+                'tail': node_gvid(_dot_unquote(match.group(1))),
+                'head': node_gvid(_dot_unquote(match.group(2))),
+            }
+            edge.update(_dot_attrs(match.group(3)))
+            edges.append(edge)
+            continue
+        
+        match = DOT_NODE_RE.match(line)
+        if match:
+            objects[node_gvid(_dot_unquote(match.group(1)))].update(_dot_attrs(match.group(2)))
+            continue
+        
+        match = DOT_GRAPH_RE.match(line)
+        if match and 'directed' not in graph:
+            graph['strict'] = match.group(1) is not None
+            graph['directed'] = match.group(2) == 'digraph'
+            name = match.group(3) if match.group(3) is not None else match.group(4)
+            if name:
+                graph['name'] = _dot_unquote(name)
+    
+    if 'directed' not in graph:
+        raise ValueError("no 'digraph' or 'graph' header found")
+    
+    return graph
 
 
 class TerraformGraphParser:
     """Parses Terraform graph JSON and extracts nodes and edges."""
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, use_cache: bool = True):
         """
         Initialize the parser with a graph file path.
         
         Args:
             file_path: Path to the graph.json file
+            use_cache: Whether to reuse a previous parse of an unchanged file
         """
         self.file_path = file_path
+        self.use_cache = use_cache
+        # Appended rather than substituted, so graph.json and graph.dot
+        # next to each other do not share a cache file
+        self.cache_path = Path(str(file_path) + '.parsed.json')
         self.raw_data = None
-        self.nodes = []
-        self.edges = []
+        self.streaming = False
+        self.node_cols = {name: [] for name in NODE_COLUMNS}
+        self.edge_cols = {name: [] for name in EDGE_COLUMNS}
+    
+    @classmethod
+    def from_dot(cls, lines: Iterable[str], source: str = '<memory>') -> 'TerraformGraphParser':
+        """
+        Create a parser over DOT output of 'terraform graph'.
+        
+        Args:
+            lines: DOT source, one statement per line
+            source: Name describing where the data came from
+            
+        Returns:
+            Parser with the graph loaded; parse() will not read any file
+        """
+        parser = cls(source, use_cache=False)
+        parser.raw_data = parse_dot(lines)
+        return parser
     
     def load_graph(self) -> None:
-        """Load and parse the graph JSON file."""
+        """
+        Load and parse the graph file.
+        
+        DOT files are parsed line by line. JSON files above
+        STREAMING_THRESHOLD are not loaded into memory; their 'objects' and
+        'edges' arrays are streamed with ijson when parsed.
+        """
+        try:
+            size = os.path.getsize(self.file_path)
+            with self._open_json() as f:
+                is_json = f.read(64).lstrip()[:1] == b'{'
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Graph file not found: {self.file_path}")
+        
+        if not is_json:
+            try:
+                with open(self.file_path, 'r', encoding='utf-8-sig') as f:
+                    self.raw_data = parse_dot(f)
+            except (ValueError, UnicodeDecodeError) as e:
+                raise ValueError(f"Invalid graph file {self.file_path}: neither JSON nor DOT ({e})")
+            print(f"✓ Graph file loaded successfully from {self.file_path}")
+            return
+        
+        if ijson is not None and size > STREAMING_THRESHOLD:
+            self.streaming = True
+            print(f"✓ Streaming graph file from {self.file_path} ({size} bytes)")
+            return
+        
         try:
-            with open(self.file_path, 'r') as f:
-                self.raw_data = json.load(f)
+            with self._open_json() as f:
+                self.raw_data = decode_graph(f.read())
             print(f"✓ Graph file loaded successfully from {self.file_path}")
         except FileNotFoundError:
             raise FileNotFoundError(f"Graph file not found: {self.file_path}")
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             raise ValueError(f"Invalid JSON in graph file: {e}")
     
-    def parse_nodes(self) -> List[Dict[str, Any]]:
+    def _open_json(self) -> BinaryIO:
         """
-        Extract and parse nodes from the graph.
+        Open the graph file for binary reading, past any UTF-8 BOM.
         
         Returns:
-            List of node dictionaries with properties
+            File object positioned at the start of the content
         """
-        if not self.raw_data:
+        f = open(self.file_path, 'rb')
+        if f.read(len(codecs.BOM_UTF8)) != codecs.BOM_UTF8:
+            f.seek(0)
+        return f
+    
+    def _check_loaded(self) -> None:
+        """Raise if load_graph() has not been called yet."""
+        if not self.raw_data and not self.streaming:
             raise ValueError("Graph data not loaded. Call load_graph() first.")
+    
+    def _iter_items(self, key: str) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the entries of a top-level array of the graph.
         
-        self.nodes = []
+        Args:
+            key: Name of the array ('objects' or 'edges')
+            
+        Yields:
+            Raw entry dictionaries, streamed from disk in streaming mode
+        """
+        if not self.streaming:
+            yield from self.raw_data.get(key, [])
+            return
         
-        # The graph structure from 'dot -Tjson' has 'objects' array
-        for obj in self.raw_data.get('objects', []):
-            # Skip if not a node
-            if obj.get('_gvid') is None:
-                continue
+        with self._open_json() as f:
+            yield from ijson.items(f, f'{key}.item', use_float=True)
+    
+    def _read_header(self) -> Dict[str, Any]:
+        """
+        Read the top-level scalar attributes of the graph.
+        
+        Returns:
+            Dictionary with whichever of METADATA_KEYS are present
+        """
+        if not self.streaming:
+            return self.raw_data
+        
+        header = {}
+        with self._open_json() as f:
+            for prefix, event, value in ijson.parse(f):
+                if prefix in METADATA_KEYS and event in ('string', 'boolean', 'number'):
+                    header[prefix] = value
+                    if len(header) == len(METADATA_KEYS):
+                        break
+        return header
+    
+    @staticmethod
+    def _extract_extras(obj: Dict[str, Any], excluded: frozenset) -> Dict[str, Any]:
+        """
+        Copy the attributes of a graph entry that are not mapped to columns.
+        
+        Keys and string values are interned: the same attribute names and
+        values (shapes, styles, labels) repeat across every node and edge.
+        
+        Args:
+            obj: Raw node or edge dictionary
+            excluded: Keys to leave out
             
-            node = {
-                'id': str(obj.get('_gvid')),
-                'name': obj.get('name', ''),
-                'label': obj.get('label', obj.get('name', '')),
-            }
+        Returns:
+            Dictionary of the remaining attributes
+        """
+        return {
+            intern(key): intern(value) if type(value) is str else value
+            for key, value in obj.items()
+            if key not in excluded
+        }
+    
+    @staticmethod
+    def _node_id(obj: Dict[str, Any]) -> str:
+        """
+        Get the stable identity of a graph node.
+        
+        The Terraform address in 'name' is used rather than the ordinal
+        '_gvid', which shifts for every later node whenever a resource is
+        added or removed.
+        
+        Args:
+            obj: Raw node dictionary with a '_gvid'
             
-            # Add any additional attributes
-            for key, value in obj.items():
-                if key not in ['_gvid', 'name', 'label', '_draw_', '_ldraw_']:
-                    node[key] = value
+        Returns:
+            Interned node id; the '_gvid' only for nodes without a name
+        """
+        return intern(obj.get('name') or str(obj['_gvid']))
+    
+    def _node_ids(self) -> Dict[Any, str]:
+        """
+        Map the '_gvid' that edges reference to each node's stable id.
+        
+        Returns:
+            Dictionary of '_gvid' to node id
+        """
+        return {
+            obj['_gvid']: self._node_id(obj)
+            for obj in self._iter_items('objects')
+            if obj.get('_gvid') is not None
+        }
+    
+    @staticmethod
+    def _content_hash(*values: Any) -> str:
+        """
+        Compute a short, stable digest of JSON-serialisable values.
+        
+        Args:
+            *values: Values to hash; dictionary key order does not matter
             
-            self.nodes.append(node)
+        Returns:
+            Hex digest used to detect changes between runs
+        """
+        payload = json.dumps(values, sort_keys=True, default=str).encode()
+        return hashlib.blake2b(payload, digest_size=8).hexdigest()
+    
+    @staticmethod
+    def _to_columns(rows: List[tuple], names: tuple) -> Dict[str, List[Any]]:
+        """
+        Transpose row tuples into named column lists.
         
-        print(f"✓ Parsed {len(self.nodes)} nodes")
-        return self.nodes
+        Args:
+            rows: Row tuples, one value per column
+            names: Column names, in row order
+            
+        Returns:
+            Dictionary mapping each column name to its list of values
+        """
+        columns = zip(*rows) if rows else [()] * len(names)
+        return {name: list(values) for name, values in zip(names, columns)}
     
-    def parse_edges(self) -> List[Dict[str, Any]]:
+    def parse_nodes(self, node_ids: Optional[Dict[Any, str]] = None) -> Dict[str, List[Any]]:
+        """
+        Extract and parse nodes from the graph.
+        
+        Nodes are stored column-wise: entry i of every column belongs to
+        the same node, 'id' is its Terraform address, 'extras' holds its
+        remaining attributes and 'hash' a digest of its name, label and
+        extras.
+        
+        Args:
+            node_ids: Map of '_gvid' to node id from _node_ids(); ids are
+                derived per node when not given
+        
+        Returns:
+            Dictionary of 'id', 'name', 'label', 'extras' and 'hash' columns
+        """
+        self._check_loaded()
+        
+        # The graph structure from 'dot -Tjson' has 'objects' array;
+        # entries without a _gvid are not nodes. Ids are interned so that
+        # edge endpoints share the same string objects.
+        rows = [
+            (
+                node_ids[obj['_gvid']] if node_ids is not None else self._node_id(obj),
+                obj.get('name', ''),
+                obj.get('label', obj.get('name', '')),
+                self._extract_extras(obj, NODE_EXCLUDED_KEYS),
+            )
+            for obj in self._iter_items('objects')
+            if obj.get('_gvid') is not None
+        ]
+        self.node_cols = self._to_columns(rows, NODE_COLUMNS[:-1])
+        self.node_cols['hash'] = [
+            self._content_hash(name, label, extras)
+            for name, label, extras in zip(
+                self.node_cols['name'], self.node_cols['label'], self.node_cols['extras']
+            )
+        ]
+        
+        with _print_lock:
+            print(f"✓ Parsed {len(self.node_cols['id'])} nodes")
+        return self.node_cols
+    
+    def parse_edges(self, node_ids: Optional[Dict[Any, str]] = None) -> Dict[str, List[Any]]:
         """
         Extract and parse edges from the graph.
         
+        Edges are stored column-wise like nodes, with 'source' and 'target'
+        holding node ids. A node pair is only kept once, as the first edge
+        between them: Neo4j stores a single DEPENDS_ON relationship per
+        source and target, whatever the label.
+        
+        Args:
+            node_ids: Map of '_gvid' to node id from _node_ids(); built
+                here when not given
+        
         Returns:
-            List of edge dictionaries with source, target, and properties
+            Dictionary of 'source', 'target', 'label' and 'extras' columns
         """
-        if not self.raw_data:
-            raise ValueError("Graph data not loaded. Call load_graph() first.")
+        self._check_loaded()
         
-        self.edges = []
+        # The graph structure from 'dot -Tjson' has 'edges' array, whose
+        # 'tail' and 'head' reference nodes by _gvid
+        ids = node_ids if node_ids is not None else self._node_ids()
+        rows = [
+            (
+                ids.get(edge_data.get('tail')) or intern(str(edge_data.get('tail'))),
+                ids.get(edge_data.get('head')) or intern(str(edge_data.get('head'))),
+                intern(str(edge_data.get('label', 'DEPENDS_ON'))),
+                self._extract_extras(edge_data, EDGE_EXCLUDED_KEYS),
+            )
+            for edge_data in self._iter_items('edges')
+        ]
         
-        # The graph structure from 'dot -Tjson' has 'edges' array
-        for edge_data in self.raw_data.get('edges', []):
-            edge = {
-                'source': str(edge_data.get('tail')),
-                'target': str(edge_data.get('head')),
-                'label': edge_data.get('label', 'DEPENDS_ON'),
-            }
-            
-            # Add any additional attributes
-            for key, value in edge_data.items():
-                if key not in ['tail', 'head', 'label', '_draw_', '_ldraw_', '_hdraw_']:
-                    edge[key] = value
-            
-            self.edges.append(edge)
+        # Drop repeated (source, target) edges, keeping the first
+        seen = set()
+        unique_rows = []
+        for row in rows:
+            key = row[:2]
+            if key not in seen:
+                seen.add(key)
+                unique_rows.append(row)
         
-        print(f"✓ Parsed {len(self.edges)} edges")
-        return self.edges
+        self.edge_cols = self._to_columns(unique_rows, EDGE_COLUMNS)
+        
+        duplicates = len(rows) - len(unique_rows)
+        with _print_lock:
+            print(f"✓ Parsed {len(unique_rows)} edges ({duplicates} duplicates skipped)")
+        return self.edge_cols
     
     def get_graph_metadata(self) -> Dict[str, Any]:
         """
@@ -104,33 +476,128 @@ class TerraformGraphParser:
         Returns:
             Dictionary with graph metadata
         """
-        if not self.raw_data:
-            raise ValueError("Graph data not loaded. Call load_graph() first.")
+        self._check_loaded()
+        
+        header = self._read_header()
         
         metadata = {
-            'name': self.raw_data.get('name', 'terraform_graph'),
-            'directed': self.raw_data.get('directed', True),
-            'strict': self.raw_data.get('strict', False),
-            'node_count': len(self.nodes),
-            'edge_count': len(self.edges),
+            'name': header.get('name', 'terraform_graph'),
+            'directed': header.get('directed', True),
+            'strict': header.get('strict', False),
+            'node_count': len(self.node_cols['id']),
+            'edge_count': len(self.edge_cols['source']),
+            # Changes whenever any node or edge does
+            'graph_hash': self._content_hash(
+                self.node_cols['id'], self.node_cols['hash'],
+                self.edge_cols['source'], self.edge_cols['target'], self.edge_cols['label'],
+            ),
         }
         
         return metadata
     
+    def _cache_key(self) -> Optional[Tuple[int, int, int]]:
+        """
+        Identify the current version of the graph file.
+        
+        Returns:
+            (CACHE_VERSION, mtime_ns, size) of the graph file, or None if it
+            cannot be read
+        """
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return (CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    
+    def _load_cache(self, key: Tuple[int, int, int]) -> Optional[Dict[str, Any]]:
+        """
+        Load a cached parse result if it matches the graph file.
+        
+        The cache is plain JSON, so a file planted next to the graph can at
+        worst yield a wrong parse, never run code.
+        
+        Args:
+            key: Current cache key of the graph file
+            
+        Returns:
+            Cached parse result, or None on a miss
+        """
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cached = orjson.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        
+        # JSON has no tuples; the key is stored as a list
+        if not isinstance(cached, dict) or cached.get('key') != list(key):
+            return None
+        return cached.get('data')
+    
+    def _save_cache(self, key: Tuple[int, int, int], data: Dict[str, Any]) -> None:
+        """
+        Store a parse result next to the graph file.
+        
+        Args:
+            key: Cache key of the parsed graph file
+            data: Parse result to store
+        """
+        payload = orjson.dumps({'key': list(key), 'data': data})
+        if isinstance(payload, str):  # stdlib json fallback
+            payload = payload.encode()
+        
+        try:
+            with open(self.cache_path, 'wb') as f:
+                f.write(payload)
+        except OSError as e:
+            print(f"Note: Could not write parse cache {self.cache_path}: {e}")
+    
     def parse(self) -> Dict[str, Any]:
         """
         Load and parse the entire graph.
         
+        When caching is enabled and the graph file's mtime and size match
+        the cache, the previous result is returned without re-parsing. The
+        decoded JSON tree is released once nodes and edges are extracted.
+        
         Returns:
-            Dictionary with nodes, edges, and metadata
+            Dictionary with node columns, edge columns, and metadata
         """
-        self.load_graph()
-        nodes = self.parse_nodes()
-        edges = self.parse_edges()
+        key = self._cache_key() if self.use_cache else None
+        if key is not None:
+            cached = self._load_cache(key)
+            if cached is not None:
+                self.node_cols = cached['nodes']
+                self.edge_cols = cached['edges']
+                print(f"✓ Reusing cached parse from {self.cache_path}")
+                return cached
+        
+        if self.raw_data is None:
+            self.load_graph()
+        
+        # Edges reference nodes by _gvid; map those to node ids once, up
+        # front, and share the map with both workers
+        node_ids = self._node_ids()
+        
+        # Nodes and edges come from disjoint parts of the graph; in streaming
+        # mode each reads the file independently, overlapping the I/O
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            nodes_future = executor.submit(self.parse_nodes, node_ids)
+            edges_future = executor.submit(self.parse_edges, node_ids)
+            nodes = nodes_future.result()
+            edges = edges_future.result()
+        
         metadata = self.get_graph_metadata()
         
-        return {
+        # The columns hold everything needed; free the decoded JSON tree
+        self.raw_data = None
+        
+        result = {
             'nodes': nodes,
             'edges': edges,
             'metadata': metadata
         }
+        
+        if key is not None:
+            self._save_cache(key, result)
+        
+        return result
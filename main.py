@@ -3,93 +3,123 @@
 Main script to ingest Terraform graph into Neo4j.
 
 Usage:
-    python main.py [--graph-file GRAPH_FILE] [--clear] [--skip-generate]
+    python main.py [--graph-file GRAPH_FILE] [--clear] [--skip-generate] [--verify]
 
 Examples:
     # Generate graph and ingest into Neo4j
     python main.py
     
-    # Use existing graph file
+    # Generate graph, also saving its DOT source to a file
+    python main.py --graph-file graph.dot
+    
+    # Use existing graph file (DOT, or JSON from 'dot -Tjson')
     python main.py --graph-file custom_graph.json --skip-generate
     
-    # Don't clear existing data
-    python main.py --no-clear
+    # Clear existing data and ingest from scratch
+    python main.py --clear
+    
+    # Query database totals after ingesting
+    python main.py --verify
 """
 
 import os
 import sys
 import argparse
+import asyncio
+import gc
+import io
 import subprocess
 from pathlib import Path
+from typing import Any, Dict, Optional
 from dotenv import load_dotenv
 
 from graph_parser import TerraformGraphParser
 from neo4j_connector import Neo4jConnector
 
 
-def generate_terraform_graph(output_file: str) -> bool:
+# Graph file read by --skip-generate when --graph-file is not given
+DEFAULT_GRAPH_FILE = 'graph.json'
+
+
+def generate_terraform_graph(output_file: Optional[str] = None) -> Optional[str]:
     """
-    Generate Terraform graph using terraform and dot commands.
+    Generate Terraform graph using the terraform command.
     
     Args:
-        output_file: Path to save the graph JSON file
+        output_file: Optional path to also save the graph DOT source
         
     Returns:
-        True if successful, False otherwise
+        The DOT source produced by terraform if successful, None otherwise
     """
     print("\n🔄 Generating Terraform graph...")
     
     try:
-        # Check if terraform is available
-        subprocess.run(['terraform', 'version'], 
-                      capture_output=True, 
-                      check=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
+        # Generate the graph: terraform graph, kept in memory. A missing
+        # terraform binary surfaces here, so no separate version check runs.
+        terraform_proc = subprocess.run(
+            ['terraform', 'graph'],
+            capture_output=True,
+            text=True
+        )
+    except FileNotFoundError:
         print("❌ Error: terraform command not found. Please install Terraform.")
-        return False
+        return None
     
     try:
-        # Check if dot (graphviz) is available
-        subprocess.run(['dot', '-V'], 
-                      capture_output=True, 
-                      check=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("❌ Error: dot command not found. Please install Graphviz.")
-        return False
-    
-    try:
-        # Generate the graph: terraform graph | dot -Tjson > graph.json
-        terraform_proc = subprocess.Popen(
-            ['terraform', 'graph'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        with open(output_file, 'w') as f:
-            dot_proc = subprocess.run(
-                ['dot', '-Tjson'],
-                stdin=terraform_proc.stdout,
-                stdout=f,
-                stderr=subprocess.PIPE,
-                check=True
-            )
-        
-        terraform_proc.wait()
-        
         if terraform_proc.returncode != 0:
-            stderr = terraform_proc.stderr.read().decode()
-            print(f"❌ Terraform graph generation failed: {stderr}")
-            return False
+            print(f"❌ Terraform graph generation failed: {terraform_proc.stderr}")
+            return None
         
-        print(f"✓ Graph generated successfully: {output_file}")
-        return True
+        if output_file:
+            with open(output_file, 'w') as f:
+                f.write(terraform_proc.stdout)
+            print(f"✓ Graph generated successfully: {output_file}")
+        else:
+            print("✓ Graph generated successfully")
+        return terraform_proc.stdout
         
     except Exception as e:
         print(f"❌ Error generating graph: {e}")
-        return False
+        return None
+
+
+def parse_graph(graph_dot: Optional[str], graph_file: str, use_cache: bool) -> Dict[str, Any]:
+    """
+    Parse the generated graph, or the graph file when nothing was generated.
+    
+    Args:
+        graph_dot: DOT source produced by generate_terraform_graph, if any
+        graph_file: Path to the graph file (DOT or JSON) to use otherwise
+        use_cache: Whether to reuse a cached parse of the graph file
+        
+    Returns:
+        Parsed graph data
+    """
+    if graph_dot is not None:
+        print("\n📊 Parsing generated graph...")
+        # Iterate the lines in place rather than copying them into a list
+        parser = TerraformGraphParser.from_dot(io.StringIO(graph_dot))
+    else:
+        print(f"\n📊 Parsing graph from {graph_file}...")
+        parser = TerraformGraphParser(graph_file, use_cache=use_cache)
+    return parser.parse()
+
+
+async def prepare_neo4j(connector: Neo4jConnector) -> None:
+    """
+    Connect to Neo4j and create the schema needed for ingestion.
+    
+    Existing data is left untouched; clearing waits for a successful parse.
+    
+    Args:
+        connector: Connector to open
+    """
+    print(f"\n🔌 Connecting to Neo4j at {connector.uri}...")
+    await connector.connect()
+    await connector.create_constraints()
 
 
-def main():
+async def main():
     """Main execution function."""
     # Parse command line arguments
     parser = argparse.ArgumentParser(
@@ -97,18 +127,35 @@ def main():
     )
     parser.add_argument(
         '--graph-file',
-        default='graph.json',
-        help='Path to graph JSON file (default: graph.json)'
+        help='Path to graph file (DOT or JSON); with --skip-generate it is read '
+             f'(default: {DEFAULT_GRAPH_FILE}), otherwise the generated DOT '
+             'is also saved there'
     )
     parser.add_argument(
         '--skip-generate',
         action='store_true',
         help='Skip terraform graph generation and use existing file'
     )
+    parser.add_argument(
+        '--clear',
+        action='store_true',
+        help='Clear existing data in Neo4j before ingesting instead of '
+             'updating it incrementally'
+    )
     parser.add_argument(
         '--no-clear',
         action='store_true',
-        help='Do not clear existing data in Neo4j before ingesting'
+        help=argparse.SUPPRESS
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Re-parse the graph file even if a cached parse is up to date'
+    )
+    parser.add_argument(
+        '--verify',
+        action='store_true',
+        help='Query total node and relationship counts after ingesting'
     )
     
     args = parser.parse_args()
@@ -127,29 +174,55 @@ def main():
         sys.exit(1)
     
     # Generate graph if needed
+    graph_dot = None
+    graph_file = args.graph_file or DEFAULT_GRAPH_FILE
     if not args.skip_generate:
-        if not generate_terraform_graph(args.graph_file):
+        graph_dot = generate_terraform_graph(args.graph_file)
+        if graph_dot is None:
             sys.exit(1)
-    
-    # Check if graph file exists
-    if not Path(args.graph_file).exists():
-        print(f"❌ Error: Graph file not found: {args.graph_file}")
+    elif not Path(graph_file).exists():
+        # Check if graph file exists
+        print(f"❌ Error: Graph file not found: {graph_file}")
         sys.exit(1)
     
+    clear_existing = args.clear
+    connector = Neo4jConnector(neo4j_uri, neo4j_user, neo4j_password)
+    
     try:
-        # Parse the graph
-        print(f"\n📊 Parsing graph from {args.graph_file}...")
-        parser = TerraformGraphParser(args.graph_file)
-        graph_data = parser.parse()
+        # Parse the graph in a worker thread while Neo4j is being connected
+        # and its schema created, hiding the parse time behind the network
+        # round trips. Data is only cleared by ingest_graph, after parsing.
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            loop.run_in_executor(
+                None, parse_graph, graph_dot, graph_file, not args.no_cache
+            ),
+            prepare_neo4j(connector),
+            return_exceptions=True,
+        )
+        
+        # Both tasks have settled, so a failed parse cannot leave connect()
+        # in flight while the connector is closed below
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        graph_data = results[0]
+        
+        # Release the raw graph before the driver starts buffering batches
+        del graph_dot
+        gc.collect()
+        
+        # Ingest data; the returned counts replace a full-graph stats query
+        written = await connector.ingest_graph(
+            graph_data, clear_existing=clear_existing, prepared=True
+        )
+        print(f"\n📈 Ingestion statistics:")
+        print(f"  - Nodes written: {written['nodes']}")
+        print(f"  - Relationships written: {written['relationships']}")
         
-        # Connect to Neo4j and ingest data
-        print(f"\n🔌 Connecting to Neo4j at {neo4j_uri}...")
-        with Neo4jConnector(neo4j_uri, neo4j_user, neo4j_password) as connector:
-            clear_existing = not args.no_clear
-            connector.ingest_graph(graph_data, clear_existing=clear_existing)
-            
-            # Display final stats
-            stats = connector.get_stats()
+        # Display final stats; this scans the whole graph, so only on request
+        if args.verify:
+            stats = await connector.get_stats()
             print(f"\n📈 Database statistics:")
             print(f"  - Total nodes: {stats['nodes']}")
             print(f"  - Total relationships: {stats['relationships']}")
@@ -163,7 +236,9 @@ def main():
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        await connector.close()
 
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())
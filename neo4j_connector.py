@@ -2,11 +2,19 @@
 Neo4j connector module for ingesting Terraform graph data.
 """
 
-from neo4j import GraphDatabase
-from typing import List, Dict, Any
+import asyncio
+from neo4j import AsyncGraphDatabase
+from typing import List, Dict, Any, Optional
 import os
 
 
+# Number of rows sent per UNWIND transaction during ingestion
+BATCH_SIZE = 1000
+
+# Maximum number of batch transactions in flight at the same time
+MAX_CONCURRENT_BATCHES = 8
+
+
 class Neo4jConnector:
     """Handles connection and data ingestion to Neo4j database."""
     
@@ -23,151 +31,452 @@ class Neo4jConnector:
         self.user = user
         self.password = password
         self.driver = None
+        self.apoc_available = False
     
-    def connect(self) -> None:
+    async def connect(self) -> None:
         """Establish connection to Neo4j database."""
         try:
-            self.driver = GraphDatabase.driver(self.uri, auth=(self.user, self.password))
+            self.driver = AsyncGraphDatabase.driver(self.uri, auth=(self.user, self.password))
             # Verify connectivity
-            self.driver.verify_connectivity()
+            await self.driver.verify_connectivity()
             print(f"✓ Connected to Neo4j at {self.uri}")
         except Exception as e:
             raise ConnectionError(f"Failed to connect to Neo4j: {e}")
+        
+        self.apoc_available = await self._check_apoc()
+    
+    async def _check_apoc(self) -> bool:
+        """
+        Check whether the APOC periodic procedures are installed.
+        
+        Returns:
+            True if apoc.periodic.iterate can be used, False otherwise
+        """
+        async with self.driver.session() as session:
+            try:
+                result = await session.run("CALL apoc.help('periodic')")
+                await result.consume()
+                return True
+            except Exception:
+                print("Note: APOC not available, using inline edge ingestion")
+                return False
     
-    def close(self) -> None:
+    async def close(self) -> None:
         """Close the Neo4j driver connection."""
         if self.driver:
-            self.driver.close()
+            await self.driver.close()
             print("✓ Neo4j connection closed")
     
-    def clear_database(self) -> None:
+    async def clear_database(self) -> None:
         """Clear all nodes and relationships from the database."""
-        with self.driver.session() as session:
-            session.run("MATCH (n) DETACH DELETE n")
-            print("✓ Database cleared")
-    
-    def create_constraints(self) -> None:
-        """Create uniqueness constraints for node IDs."""
-        with self.driver.session() as session:
-            # Create constraint for TerraformResource nodes
+        async def clear(tx):
+            result = await tx.run("MATCH (n) DETACH DELETE n")
+            await result.consume()
+        
+        async with self.driver.session() as session:
+            await session.execute_write(clear)
+        print("✓ Database cleared")
+    
+    async def create_constraints(self) -> None:
+        """Create uniqueness constraints and lookup indexes for nodes."""
+        async with self.driver.session() as session:
+            # Create constraint for TerraformResource nodes; its backing
+            # index also serves the id lookups done by ingest_edges
             try:
-                session.run("""
+                result = await session.run("""
                     CREATE CONSTRAINT terraform_resource_id IF NOT EXISTS
                     FOR (n:TerraformResource) REQUIRE n.id IS UNIQUE
                 """)
+                await result.consume()
                 print("✓ Created constraint for TerraformResource nodes")
             except Exception as e:
                 print(f"Note: Constraint may already exist: {e}")
+            
+            # Create index for name lookups and ORDER BY n.name queries
+            try:
+                result = await session.run("""
+                    CREATE INDEX terraform_resource_name IF NOT EXISTS
+                    FOR (n:TerraformResource) ON (n.name)
+                """)
+                await result.consume()
+                print("✓ Created name index for TerraformResource nodes")
+            except Exception as e:
+                print(f"Note: Index may already exist: {e}")
+    
+    @staticmethod
+    async def _write_batch(tx, query: str, **params) -> int:
+        """
+        Run a counting write query inside a managed transaction.
+        
+        Args:
+            tx: Neo4j transaction provided by execute_write
+            query: Cypher query returning a single 'count' column
+            **params: Query parameters
+        
+        Returns:
+            Value of the 'count' column
+        """
+        result = await tx.run(query, **params)
+        record = await result.single()
+        return record['count']
     
-    def ingest_nodes(self, nodes: List[Dict[str, Any]]) -> int:
+    @staticmethod
+    async def _write_relationship_batch(tx, query: str, **params) -> int:
+        """
+        Run a write query inside a managed transaction, counting the
+        relationships it created.
+        
+        Args:
+            tx: Neo4j transaction provided by execute_write
+            query: Cypher query creating or merging relationships
+            **params: Query parameters
+        
+        Returns:
+            Number of relationships created by the query
+        """
+        result = await tx.run(query, **params)
+        summary = await result.consume()
+        return summary.counters.relationships_created
+    
+    async def _write_batches(self, query: str, columns: Dict[str, List[Any]],
+                             work=None) -> int:
+        """
+        Write column-wise rows in BATCH_SIZE slices, pipelining the batch
+        transactions.
+        
+        Each batch gets its own pooled session, since a session runs one
+        transaction at a time. At most MAX_CONCURRENT_BATCHES are in flight.
+        
+        Args:
+            query: Cypher query taking each column as a list parameter
+            columns: Equal-length lists keyed by query parameter name
+            work: Transaction function counting one batch; defaults to
+                _write_batch
+            
+        Returns:
+            Sum of the counts returned by every batch
+        """
+        work = work or self._write_batch
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+        size = len(next(iter(columns.values())))
+        
+        async def write(start: int) -> int:
+            # Slice only once admitted, so at most MAX_CONCURRENT_BATCHES
+            # slices exist instead of a second copy of every column
+            async with semaphore:
+                chunk = {
+                    name: values[start:start + BATCH_SIZE]
+                    for name, values in columns.items()
+                }
+                async with self.driver.session() as session:
+                    return await session.execute_write(work, query, **chunk)
+        
+        counts = await asyncio.gather(*[
+            write(start) for start in range(0, size, BATCH_SIZE)
+        ])
+        return sum(counts)
+    
+    async def ingest_nodes(self, nodes: Dict[str, List[Any]]) -> int:
         """
         Ingest nodes into Neo4j.
         
+        Nodes whose stored hash matches the parsed one are left untouched;
+        new or changed nodes get their properties replaced.
+        
         Args:
-            nodes: List of node dictionaries
+            nodes: Node columns ('id', 'name', 'label', 'extras', 'hash')
             
         Returns:
-            Number of nodes created
+            Number of nodes created or updated
         """
-        if not nodes:
+        if not nodes.get('id'):
             print("⚠ No nodes to ingest")
             return 0
         
-        with self.driver.session() as session:
-            result = session.run("""
-                UNWIND $nodes AS node
-                MERGE (n:TerraformResource {id: node.id})
-                SET n += node
-                RETURN count(n) AS count
-            """, nodes=nodes)
-            
-            count = result.single()['count']
-            print(f"✓ Ingested {count} nodes")
-            return count
+        count = await self._write_batches("""
+            UNWIND range(0, size($id) - 1) AS i
+            MERGE (n:TerraformResource {id: $id[i]})
+            WITH n, i
+            WHERE n.hash IS NULL OR n.hash <> $hash[i]
+            SET n = $extras[i]
+            SET n.id = $id[i], n.name = $name[i], n.label = $label[i], n.hash = $hash[i]
+            RETURN count(n) AS count
+        """, {
+            'id': nodes['id'],
+            'name': nodes['name'],
+            'label': nodes['label'],
+            'extras': nodes['extras'],
+            'hash': nodes['hash'],
+        })
+        
+        print(f"✓ Ingested {count} new or changed nodes")
+        return count
     
-    def ingest_edges(self, edges: List[Dict[str, Any]]) -> int:
+    async def ingest_edges(self, edges: Dict[str, List[Any]], create: bool = False) -> int:
         """
         Ingest edges/relationships into Neo4j.
         
         Args:
-            edges: List of edge dictionaries with source, target, and label
+            edges: Edge columns ('source', 'target', 'label', 'extras')
+            create: Use CREATE instead of MERGE; only safe when the edges are
+                already unique and no relationships exist yet
             
         Returns:
             Number of relationships created
         """
-        if not edges:
+        if not edges.get('source'):
             print("⚠ No edges to ingest")
             return 0
         
-        with self.driver.session() as session:
-            result = session.run("""
-                UNWIND $edges AS edge
-                MATCH (source:TerraformResource {id: edge.source})
-                MATCH (target:TerraformResource {id: edge.target})
-                MERGE (source)-[r:DEPENDS_ON]->(target)
-                SET r.label = edge.label
-                RETURN count(r) AS count
-            """, edges=edges)
+        # Only the endpoints and label are stored on the relationship
+        columns = {
+            'source': edges['source'],
+            'target': edges['target'],
+            'label': edges['label'],
+        }
+        
+        write = 'CREATE' if create else 'MERGE'
+        
+        if self.apoc_available:
+            return await self._ingest_edges_apoc(columns, write)
+        
+        count = await self._write_batches(f"""
+            UNWIND range(0, size($source) - 1) AS i
+            MATCH (source:TerraformResource {{id: $source[i]}})
+            MATCH (target:TerraformResource {{id: $target[i]}})
+            {write} (source)-[r:DEPENDS_ON]->(target)
+            SET r.label = $label[i]
+        """, columns, work=self._write_relationship_batch)
+        
+        print(f"✓ Ingested {count} relationships")
+        return count
+    
+    async def _ingest_edges_apoc(self, columns: Dict[str, List[Any]], write: str) -> int:
+        """
+        Ingest edges with apoc.periodic.iterate, batching and parallelising
+        relationship creation on the server.
+        
+        Args:
+            columns: Edge 'source', 'target' and 'label' columns
+            write: Cypher clause creating the relationship ('CREATE' or 'MERGE')
+            
+        Returns:
+            Number of relationships created
+            
+        Raises:
+            RuntimeError: If any batch failed, so the graph is not recorded
+                as ingested with relationships missing
+        """
+        async with self.driver.session() as session:
+            result = await session.run(f"""
+                CALL apoc.periodic.iterate(
+                    'UNWIND range(0, size($source) - 1) AS i
+                     RETURN $source[i] AS src, $target[i] AS tgt, $label[i] AS label',
+                    'MATCH (source:TerraformResource {{id: src}})
+                     MATCH (target:TerraformResource {{id: tgt}})
+                     {write} (source)-[r:DEPENDS_ON]->(target)
+                     SET r.label = label',
+                    {{batchSize: $batch_size, parallel: true, retries: 3,
+                     params: {{source: $source, target: $target, label: $label}}}}
+                )
+                YIELD failedOperations, failedBatches, errorMessages, updateStatistics
+                RETURN failedOperations, failedBatches, errorMessages,
+                       updateStatistics.relationshipsCreated AS relationshipsCreated
+            """, batch_size=BATCH_SIZE, **columns)
+            record = await result.single()
+        
+        if record['failedOperations'] or record['failedBatches']:
+            raise RuntimeError(
+                f"{record['failedOperations']} edge operations failed: "
+                f"{record['errorMessages']}"
+            )
+        
+        count = record['relationshipsCreated']
+        print(f"✓ Ingested {count} relationships")
+        return count
+    
+    async def prune(self, nodes: Dict[str, List[Any]], edges: Dict[str, List[Any]]) -> None:
+        """
+        Delete nodes and relationships that are no longer in the graph.
+        
+        Nodes are matched on their id, the Terraform address, so resources
+        that are still present are kept whatever else changed.
+        
+        Args:
+            nodes: Node columns of the current graph
+            edges: Edge columns of the current graph
+            
+        Raises:
+            ValueError: If the graph has no nodes, which would delete
+                every stored node
+        """
+        if not nodes.get('id'):
+            raise ValueError("Refusing to prune against an empty graph")
+        
+        async with self.driver.session() as session:
+            removed_nodes = await session.execute_write(self._write_batch, """
+                MATCH (n:TerraformResource)
+                WHERE NOT n.id IN $ids
+                DETACH DELETE n
+                RETURN count(*) AS count
+            """, ids=nodes.get('id', []))
             
-            count = result.single()['count']
-            print(f"✓ Ingested {count} relationships")
-            return count
+            removed_edges = await session.execute_write(self._write_batch, """
+                MATCH (source:TerraformResource)-[r:DEPENDS_ON]->(target:TerraformResource)
+                WHERE NOT [source.id, target.id] IN $pairs
+                DELETE r
+                RETURN count(*) AS count
+            """, pairs=[
+                [source, target]
+                for source, target in zip(edges.get('source', []), edges.get('target', []))
+            ])
+        
+        print(f"✓ Removed {removed_nodes} stale nodes and {removed_edges} stale relationships")
     
-    def ingest_graph(self, graph_data: Dict[str, Any], clear_existing: bool = True) -> Dict[str, int]:
+    async def _stored_graph_hash(self, name: str) -> Optional[str]:
+        """
+        Get the hash of the graph stored by the last ingestion.
+        
+        Args:
+            name: Graph name
+            
+        Returns:
+            Stored graph hash, or None if the graph was never ingested
+        """
+        async with self.driver.session() as session:
+            result = await session.run("""
+                MATCH (g:TerraformGraph {name: $name})
+                RETURN g.hash AS hash
+            """, name=name)
+            record = await result.single()
+        return record['hash'] if record else None
+    
+    async def _store_graph_hash(self, name: str, graph_hash: str) -> None:
+        """
+        Record the hash of the graph that was just ingested.
+        
+        Args:
+            name: Graph name
+            graph_hash: Hash of the ingested graph
+        """
+        async def store(tx):
+            result = await tx.run("""
+                MERGE (g:TerraformGraph {name: $name})
+                SET g.hash = $hash
+            """, name=name, hash=graph_hash)
+            await result.consume()
+        
+        async with self.driver.session() as session:
+            await session.execute_write(store)
+    
+    async def ingest_graph(self, graph_data: Dict[str, Any], clear_existing: bool = False,
+                           prepared: bool = False) -> Dict[str, int]:
         """
         Ingest complete graph data into Neo4j.
         
+        Node and edge batches are pipelined, with all nodes written before
+        any edge. Without clearing, ingestion is incremental: nothing is
+        written if the graph hash matches the last ingestion, otherwise
+        removed nodes and relationships are pruned and only new or changed
+        nodes are rewritten.
+        
         Args:
-            graph_data: Dictionary with 'nodes', 'edges', and 'metadata' keys
+            graph_data: Dictionary with 'nodes' and 'edges' columns and 'metadata'
             clear_existing: Whether to clear existing data before ingesting
-            
+                instead of updating it incrementally
+            prepared: Whether create_constraints() was already called
+        
         Returns:
-            Dictionary with counts of nodes and edges created
+            Dictionary with counts of nodes and relationships written, in
+            the same shape as get_stats()
         """
+        if not prepared:
+            await self.create_constraints()
+        
+        metadata = graph_data.get('metadata', {})
+        graph_name = metadata.get('name', 'terraform_graph')
+        graph_hash = metadata.get('graph_hash')
+        # A configuration without resources yields a valid, empty graph
+        empty = not graph_data.get('nodes', {}).get('id')
+        
         if clear_existing:
-            self.clear_database()
+            # Cleared only here, once a parsed graph is ready to replace it
+            await self.clear_database()
+            if empty:
+                print("⚠ Graph has no nodes, database left empty")
+                return {
+                    'nodes': 0,
+                    'relationships': 0
+                }
+        else:
+            if empty:
+                # Pruning against no ids would delete every stored node
+                print("⚠ Graph has no nodes, stored graph left unchanged "
+                      "(clear existing data to empty it)")
+                return {
+                    'nodes': 0,
+                    'relationships': 0
+                }
+            
+            if graph_hash and await self._stored_graph_hash(graph_name) == graph_hash:
+                print("\n✓ Graph unchanged since last ingestion, nothing to write")
+                return {
+                    'nodes': 0,
+                    'relationships': 0
+                }
+            
+            await self.prune(graph_data.get('nodes', {}), graph_data.get('edges', {}))
         
-        self.create_constraints()
+        nodes_count = await self.ingest_nodes(graph_data.get('nodes', {}))
+        # Edges are deduplicated by the parser, so a freshly cleared
+        # database can take plain CREATEs without an existence check
+        edges_count = await self.ingest_edges(
+            graph_data.get('edges', {}), create=clear_existing
+        )
         
-        nodes_count = self.ingest_nodes(graph_data.get('nodes', []))
-        edges_count = self.ingest_edges(graph_data.get('edges', []))
+        if graph_hash:
+            await self._store_graph_hash(graph_name, graph_hash)
         
-        metadata = graph_data.get('metadata', {})
-        print(f"\n✓ Graph ingestion complete!")
-        print(f"  - Graph name: {metadata.get('name', 'N/A')}")
-        print(f"  - Nodes created: {nodes_count}")
-        print(f"  - Relationships created: {edges_count}")
+        print(f"\n✓ Graph ingestion complete: {graph_name}")
         
         return {
             'nodes': nodes_count,
-            'edges': edges_count
+            'relationships': edges_count
         }
     
-    def get_stats(self) -> Dict[str, int]:
+    async def get_stats(self) -> Dict[str, int]:
         """
         Get database statistics.
         
+        Each count is a separate single-pattern aggregation, which Neo4j
+        answers from its counts store without scanning the graph.
+        
         Returns:
             Dictionary with node and relationship counts
         """
-        with self.driver.session() as session:
-            result = session.run("""
+        async with self.driver.session() as session:
+            result = await session.run("""
                 MATCH (n:TerraformResource)
-                OPTIONAL MATCH ()-[r:DEPENDS_ON]->()
-                RETURN count(DISTINCT n) AS nodes, count(r) AS relationships
+                RETURN count(n) AS nodes
+            """)
+            nodes = (await result.single())['nodes']
+            
+            result = await session.run("""
+                MATCH ()-[r:DEPENDS_ON]->()
+                RETURN count(r) AS relationships
             """)
+            relationships = (await result.single())['relationships']
             
-            record = result.single()
             return {
-                'nodes': record['nodes'],
-                'relationships': record['relationships']
+                'nodes': nodes,
+                'relationships': relationships
             }
     
-    def __enter__(self):
-        """Context manager entry."""
-        self.connect()
+    async def __aenter__(self):
+        """Async context manager entry."""
+        await self.connect()
         return self
     
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        """Context manager exit."""
-        self.close()
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Async context manager exit."""
+        await self.close()